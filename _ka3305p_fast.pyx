@@ -0,0 +1,120 @@
+# cython: language_level=3
+# -*- coding: utf-8 -*-
+#
+#  Copyright 2020 pietroro
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+
+"""Optional fast polling loop used by ka3305pInstrument.log_channel
+
+Build in place with: cythonize -i _ka3305p_fast.pyx
+"""
+
+import select
+
+from libc.errno cimport EAGAIN, EINTR, errno
+from libc.stdlib cimport atof
+from libc.string cimport memcpy
+from posix.time cimport nanosleep, timespec
+from posix.unistd cimport read, write
+
+# Each sample is answered with two 5-byte fields (voltage, current)
+cdef enum:
+    FIELD_LEN = 5
+    REPLY_LEN = 2 * FIELD_LEN
+
+
+cdef int _write_all(int fd, const char *data, Py_ssize_t length, double timeout) except -1:
+    """Writes the whole command to the non-blocking port"""
+    cdef Py_ssize_t done = 0
+    cdef Py_ssize_t n
+    cdef int err
+    while done < length:
+        with nogil:
+            n = write(fd, data + done, length - done)
+            err = errno
+        if n < 0:
+            if err == EINTR:
+                continue
+            if err == EAGAIN:
+                if not select.select([], [fd], [], timeout)[1]:
+                    raise TimeoutError("Write to PSU timed out")
+                continue
+            raise OSError(err, "Write to PSU failed")
+        done += n
+    return 0
+
+
+cdef int _read_exact(int fd, char *buf, Py_ssize_t length, double timeout) except -1:
+    """Reads exactly length bytes, waiting for the port with select()"""
+    cdef Py_ssize_t got = 0
+    cdef Py_ssize_t n
+    cdef int err
+    while got < length:
+        if not select.select([fd], [], [], timeout)[0]:
+            raise TimeoutError("PSU did not reply")
+        with nogil:
+            n = read(fd, buf + got, length - got)
+            err = errno
+        if n < 0:
+            if err == EINTR or err == EAGAIN:
+                continue
+            raise OSError(err, "Read from PSU failed")
+        if n == 0:
+            raise OSError("PSU port was closed")
+        got += n
+    return 0
+
+
+def poll_batch(int fd, bytes cmd, Py_ssize_t n_samples, double dt,
+               double[::1] out_v, double[::1] out_i, double timeout=0.5):
+    """Repeatedly sends a voltage+current query and stores the replies
+
+    Args:
+        fd (int): File descriptor of the open serial port
+        cmd (bytes): Query answered with a voltage and a current field
+        n_samples (int): Number of samples to take
+        dt (float): Pause between samples [s]
+        out_v (double buffer): Receives the measured voltages [V]
+        out_i (double buffer): Receives the measured currents [A]
+        timeout (float, optional): Maximum wait for a reply [s]. Defaults to 0.5.
+
+    Returns:
+        int: Number of samples taken
+    """
+    cdef const char *c_cmd = cmd
+    cdef Py_ssize_t c_len = len(cmd)
+    cdef char buf[REPLY_LEN]
+    cdef char field[FIELD_LEN + 1]
+    cdef timespec pause
+    cdef Py_ssize_t i
+
+    if out_v.shape[0] < n_samples or out_i.shape[0] < n_samples:
+        raise ValueError("Output buffers are shorter than n_samples")
+    pause.tv_sec = <long>dt
+    pause.tv_nsec = <long>((dt - pause.tv_sec) * 1e9)
+    field[FIELD_LEN] = 0
+    for i in range(n_samples):
+        _write_all(fd, c_cmd, c_len, timeout)
+        _read_exact(fd, buf, REPLY_LEN, timeout)
+        memcpy(field, buf, FIELD_LEN)
+        out_v[i] = atof(field)
+        memcpy(field, buf + FIELD_LEN, FIELD_LEN)
+        out_i[i] = atof(field)
+        if dt > 0 and i + 1 < n_samples:
+            with nogil:
+                nanosleep(&pause, NULL)
+    return n_samples
@@ -19,70 +19,518 @@
 #  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
 #  MA 02110-1301, USA.
 
-import sys
+import logging
+import math
+import os
+import select
+import selectors
 import time
+from array import array
+from collections import deque
+from contextlib import contextmanager
+from types import MappingProxyType
+
+try:
+    # Optional compiled polling loop, see _ka3305p_fast.pyx
+    import _ka3305p_fast
+except ImportError:
+    _ka3305p_fast = None
+
+log = logging.getLogger(__name__)
+
+# Valid arguments for command sanity check
+_CHANNELS = frozenset((1, 2))
+_MODES = frozenset((0, 1, 2))
+_PANELS = frozenset((1, 2, 3, 4, 5))
+
+# Output limits of the PSU
+_VMAX = 30.0
+_IMAX = 5.0
+
+# Pre-encoded commands, built once at import so the hot path only writes bytes
+_STATIC = {cmd: cmd.encode("ascii") for cmd in (
+    "*IDN?", "STATUS?", "OUT0", "OUT1", "OCP0", "OCP1", "OVP0", "OVP1")}
+_VSET_PREFIX = {ch: b"VSET%d:" % ch for ch in _CHANNELS}
+_ISET_PREFIX = {ch: b"ISET%d:" % ch for ch in _CHANNELS}
+_OCP_PREFIX = {ch: b"OCPSTE%d:" % ch for ch in _CHANNELS}
+_OVP_PREFIX = {ch: b"OVPSTE%d:" % ch for ch in _CHANNELS}
+_VSETQ = {ch: b"VSET%d?" % ch for ch in _CHANNELS}
+_VOUTQ = {ch: b"VOUT%d?" % ch for ch in _CHANNELS}
+_ISETQ = {ch: b"ISET%d?" % ch for ch in _CHANNELS}
+_IOUTQ = {ch: b"IOUT%d?" % ch for ch in _CHANNELS}
+_RCL = {panel: b"RCL%d" % panel for panel in _PANELS}
+_SAV = {panel: b"SAV%d" % panel for panel in _PANELS}
+_TRACK = {mode: b"TRACK%d" % mode for mode in _MODES}
+# Decoded STATUS? replies, keyed by the mode (bit 0) and output (bit 6) bits
+_STATUS_MASK = 0x41
+_STATUS_LUT = {
+    mode_bit | out_bit << 6: MappingProxyType({
+        "Mode": "CV" if mode_bit else "CC",
+        "Output": "On" if out_bit else "Off"})
+    for mode_bit in (0, 1) for out_bit in (0, 1)}
+# Silence that ends replies without terminator, such as *IDN?
+_QUIET_GAP = 0.02
+# Measurement queries of read_all(), answered in order with 5 bytes each.
+# Should a firmware need terminators, join the queries with b"\n" instead.
+_READ_ALL = b"".join((_VOUTQ[1], _VOUTQ[2], _IOUTQ[1], _IOUTQ[2]))
+# Pause between measurements while waiting for an output to settle
+_SETTLE_POLL = 0.005
+
+
+def _fixed2(value):
+    """Formats a non-negative value with two decimals
+
+    The scaled value is rounded half up in binary, so near a decimal
+    halfway point the last digit can differ from "{:1.2f}" in either
+    direction: 0.015 gives 0.02 (format gives 0.01) while 1.005 gives 1.00.
+
+    Args:
+        value (float): Value to format
+
+    Returns:
+        bytes: ASCII field for the command
+    """
+    return b"%d.%02d" % divmod(int(value * 100 + 0.5), 100)
+
+
+def _fixed3(value):
+    """Formats a non-negative value with three decimals
+
+    Rounds like _fixed2, so near a decimal halfway point the last digit
+    can differ from "{:1.3f}": 1.0005 gives 1.001 (format gives 1.000).
+
+    Args:
+        value (float): Value to format
+
+    Returns:
+        bytes: ASCII field for the command
+    """
+    return b"%d.%03d" % divmod(int(value * 1000 + 0.5), 1000)
+
+
+def _check_range(name, value, vmax=None):
+    """Rejects setpoints the PSU cannot take
+
+    Args:
+        name (string): Quantity named in the error message
+        value (float): Setpoint to check
+        vmax (float, optional): Upper limit, None for no limit. Defaults to None.
+    """
+    if not (math.isfinite(value) and value >= 0 and (vmax is None or value <= vmax)):
+        raise ValueError("{} {} is out of range".format(name, value))
+
+
+# Set commands: prefixes, field formatter, name in errors, upper limit and
+# whether the command can change the CC/CV status
+_SETPOINTS = {
+    "V": (_VSET_PREFIX, _fixed2, "Voltage", _VMAX, True),
+    "I": (_ISET_PREFIX, _fixed3, "Current", _IMAX, True),
+    "OCP": (_OCP_PREFIX, _fixed3, "OCP current", None, False),
+    "OVP": (_OVP_PREFIX, _fixed3, "OVP voltage", None, False),
+}
+
+
+class PSUConnectionError(RuntimeError):
+    """Raised when the serial connection to the PSU cannot be opened or was lost"""
+
+
+class _ka3305pBase:
+    """Command building and caching shared by the sync and asyncio instruments
+
+    Nothing here talks to the port: the methods validate arguments, build
+    the bytes to send and keep the status and setpoint caches, so both
+    instrument classes only add the I/O.
+    """
+    __slots__ = ("status", "_status_cache", "_status_dirty", "_status_gen", "_last_set",
+                 "_pipeline_ok")
+
+    # Valid arguments, kept for backwards compatibility
+    channels = (1, 2)
+    modes = (0, 1, 2)
+    panels = (1, 2, 3, 4, 5)
+
+    def _init_state(self):
+        """Initialises the caches, called by the constructors
+        """
+        self.status = {}
+        self._status_cache = None
+        self._status_dirty = True
+        # Bumped by every command that can change the status, a STATUS? reply
+        # is only cached if no such command was built while it was in flight
+        self._status_gen = 0
+        self._last_set = {}
+        # Cleared once the PSU failed to answer pipelined queries in read_all
+        self._pipeline_ok = True
+
+    def _mark_dirty(self):
+        """Marks the cached status as out of date
+        """
+        self._status_dirty = True
+        self._status_gen += 1
+
+    def _invalidate(self):
+        """Forgets the cached status and setpoints
+
+        Used when the PSU settings changed in a way the driver cannot track.
+        """
+        self._mark_dirty()
+        self._last_set.clear()
+
+    @staticmethod
+    def _query_cmd(table, channel):
+        """Returns the query for channel from a pre-encoded table
 
-import serial
+        Args:
+            table (dict): Pre-encoded queries by channel
+            channel (int): Channel to query
+
+        Returns:
+            bytes: Query to write
+        """
+        if channel not in _CHANNELS:
+            raise ValueError("Channel {} does not exist".format(channel))
+        return table[channel]
+
+    def _setpoint_cmd(self, kind, channel, value):
+        """Builds a set command, skipping values the PSU already has
 
+        Args:
+            kind (string): Key of _SETPOINTS ("V", "I", "OCP" or "OVP")
+            channel (int): Channel on which to set the value
+            value (float): Value to be set
+
+        Returns:
+            tuple: (command, memo key, wire field), None if the value is already set.
+                Store the field in _last_set under the key once the command is sent.
+        """
+        prefixes, fmt, name, vmax, affects_status = _SETPOINTS[kind]
+        if channel not in _CHANNELS:
+            raise ValueError("Channel {} does not exist".format(channel))
+        _check_range(name, value, vmax)
+        key = (kind, channel)
+        wire = fmt(value)
+        if self._last_set.get(key) == wire:
+            return None
+        if affects_status:
+            self._mark_dirty()
+        return prefixes[channel] + wire, key, wire
+
+    def _toggle_cmd(self, name, state):
+        """Builds an ON/OFF command
+
+        Args:
+            name (string): Command name, "OUT", "OCP" or "OVP"
+            state (bool): True to turn on, False to turn off
+
+        Returns:
+            bytes: Command to write, None if state is not a bool
+        """
+        self._mark_dirty()
+        if(state == True):
+            return _STATIC[name + "1"]
+        elif(state == False):
+            return _STATIC[name + "0"]
+        return None
+
+    def _recall_cmd(self, panel):
+        """Returns the command recalling a panel slot
+
+        Args:
+            panel (int): Panel setting to recall, an integer between 1 and 5
+
+        Returns:
+            bytes: Command to write
+        """
+        if panel not in _PANELS:
+            raise ValueError("Panel {} does not exist".format(panel))
+        # Recalling a panel changes setpoints behind our back
+        self._invalidate()
+        return _RCL[panel]
+
+    def _save_cmd(self, panel):
+        """Returns the command saving to a panel slot
+
+        Args:
+            panel (int): Panel setting to overwrite, an integer between 1 and 5
+
+        Returns:
+            bytes: Command to write
+        """
+        if panel not in _PANELS:
+            raise ValueError("Panel {} does not exist".format(panel))
+        self._mark_dirty()
+        return _SAV[panel]
+
+    def _mode_cmd(self, mode):
+        """Returns the tracking mode command
+
+        Args:
+            mode (int): Possibilities are 0=INDEP, 1=SER, 2=PARA
+
+        Returns:
+            bytes: Command to write
+        """
+        if mode not in _MODES:
+            raise ValueError("Mode {} does not exist".format(mode))
+        # Tracking couples the channels, the remembered setpoints no longer hold
+        self._invalidate()
+        return _TRACK[mode]
 
-class ka3305pInstrument:
-    # Status variables
-    isConnected = False
-    psu_com = None
-    status = {}
+    def _cached_status(self, force):
+        """Returns the cached status, None if the PSU has to be queried
 
-    # Helper variables for command sanity check
-    channels = [1,2]
-    modes = [0,1,2]
-    panels = [1,2,3,4,5]
+        Args:
+            force (bool): Bypass the cached status
+
+        Returns:
+            mapping: Cached status or None
+        """
+        if not force and not self._status_dirty:
+            return self._status_cache
+        return None
+
+    def _decode_status(self, raw, gen):
+        """Decodes and caches the STATUS? reply
+
+        Args:
+            raw (bytes): One byte reply
+            gen (int): Value of _status_gen when the query was built. The reply
+                is not cached if a status changing command was built since.
+
+        Returns:
+            mapping: Read-only mapping containing the current mode (CC - current, CV - voltage) and output status
+        """
+        self.status = _STATUS_LUT[raw[0] & _STATUS_MASK]
+        if gen == self._status_gen:
+            self._status_cache = self.status
+            self._status_dirty = False
+        return self.status
+
+    @staticmethod
+    def _decode_fields(raw):
+        """Splits a reply of concatenated 5-byte numeric answers
+
+        Args:
+            raw (bytes): Reply from PSU
+
+        Returns:
+            tuple: One float per answer
+        """
+        return tuple(float(raw[i:i + 5]) for i in range(0, len(raw), 5))
+
+
+class ka3305pInstrument(_ka3305pBase):
+    __slots__ = ("psu_com", "isConnected", "_batch_buf", "_batch_delay")
     
     def __init__(self, psu_com):
         """Constructor
 
         Args:
             psu_com (string): COM port on which serial is connected
+
+        Raises:
+            PSUConnectionError: The COM port could not be opened
         """
+        self.psu_com = None
+        self.isConnected = False
+        self._init_state()
+        self._batch_buf = None
+        self._batch_delay = 0
+        # Imported here so importing this module does not load pyserial
+        import serial
+
         try:
             psu_com = serial.Serial(
                 port=psu_com,
                 baudrate=9600,
                 parity=serial.PARITY_NONE,
                 stopbits=serial.STOPBITS_ONE,
-                bytesize=serial.EIGHTBITS
+                bytesize=serial.EIGHTBITS,
+                timeout=0.5,
+                write_timeout=0.5,
+                dsrdtr=False,
+                rtscts=False,
+                xonxoff=False
             )
-            psu_com.isOpen()
-            self.psu_com = psu_com
-            self.isConnected = True
-            self.status=self.getStatus()
-        except:
-            print("COM port failure:")
-            print(sys.exc_info())
-            self.psu_com = None
-            self.isConnected = False
+        except (serial.SerialException, OSError) as exc:
+            log.exception("COM port failure on %s", psu_com)
+            raise PSUConnectionError(str(exc)) from exc
+        self.psu_com = psu_com
+        self.isConnected = True
     
     def close(self):
         """Closes connection to the PSU
         """
         self.psu_com.close()
+        self.isConnected = False
+
+    def fileno(self):
+        """Returns the file descriptor of the serial port, used by PSUBank
+
+        Returns:
+            int: File descriptor
+        """
+        return self.psu_com.fileno()
     
-    def serWriteAndRecieve(self, data, delay=0.05):
-        """Helper function to write to serial adapter and read from buffer
+    def serWriteAndRecieve(self, data, expected=None, terminator=None):
+        """Helper function to write to serial adapter and read the reply
+
+        The read blocks until the reply is complete or the port timeout
+        expires, so no fixed delay is needed between request and reply.
+        Without expected or terminator, whatever arrives before the line goes
+        quiet is returned.
 
         Args:
-            data (string): Data to write to serial adapter
-            delay (float, optional): Delay between request and reply. Defaults to 0.05.
+            data (string or bytes): Data to write to serial adapter
+            expected (int, optional): Number of bytes in the reply. Defaults to None.
+            terminator (bytes, optional): Read until this sequence instead. Defaults to None.
 
         Returns:
-            latin-1 encoded chars: Reply from PSU
-        """
-        self.psu_com.write(data.encode())
-        out = ''
-        time.sleep(delay)
-        while self.psu_com.inWaiting() > 0:
-            out += self.psu_com.read(1).decode("latin-1")
-        if out != '':
-            return out	# Store measurements
+            latin-1 encoded chars: Reply from PSU, None if no reply was read
+        """
+        if isinstance(data, str):
+            data = data.encode()
+        raw = self._txn(data, expected, terminator)
+        if expected is None and terminator is None and self._batch_buf is None:
+            raw = self._read_quiet()
+        if raw:
+            return raw.decode("latin-1")
         return None
+
+    def _txn(self, data, expected=None, terminator=None):
+        """Writes pre-encoded bytes and reads the raw reply
+
+        Args:
+            data (bytes): Command to write to serial adapter
+            expected (int, optional): Number of bytes in the reply. Defaults to None.
+            terminator (bytes, optional): Read until this sequence instead. Defaults to None.
+
+        Returns:
+            bytes: Reply from PSU, None if no reply was requested
+        """
+        if self._batch_buf is not None:
+            if expected is not None or terminator is not None:
+                raise RuntimeError("Queries cannot be batched, they need a reply")
+            self._batch_buf += data
+            return None
+        # Drop late bytes of an earlier reply so they are not read as this one
+        self.psu_com.reset_input_buffer()
+        self.psu_com.write(data)
+        self.psu_com.flush()
+        if expected is not None:
+            reply = self.psu_com.read(expected)
+        elif terminator is not None:
+            reply = self.psu_com.read_until(terminator)
+        else:
+            reply = None
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("TX %r -> RX %r", data, reply)
+        return reply
+
+    def _read_quiet(self, gap=_QUIET_GAP):
+        """Reads a reply without terminator until the PSU goes silent
+
+        The read ends once no byte arrived for gap seconds, or after the
+        port timeout if the PSU keeps sending.
+
+        Args:
+            gap (float, optional): Silence that ends the reply [s]. Defaults to 0.02.
+
+        Returns:
+            bytes: Rest of the reply
+        """
+        out = b""
+        deadline = time.monotonic() + self.psu_com.timeout
+        while time.monotonic() < deadline:
+            time.sleep(gap)
+            n = self.psu_com.in_waiting
+            if not n:
+                break
+            out += self.psu_com.read(n)
+        return out
+
+    def _read_full(self, data, expected):
+        """Sends a query and keeps reading until expected bytes arrived
+
+        Long replies may take more than one port timeout, so reading goes on
+        while bytes still arrive.
+
+        Args:
+            data (bytes): Query to write to serial adapter
+            expected (int): Length of the reply
+
+        Returns:
+            bytes: Reply, shorter than expected only if the PSU went silent
+        """
+        raw = self._txn(data, expected=expected)
+        while len(raw) < expected:
+            chunk = self.psu_com.read(expected - len(raw))
+            if not chunk:
+                break
+            raw += chunk
+        return raw
+
+    def _read_float(self, data):
+        """Sends a query with a fixed width numeric reply
+
+        Args:
+            data (bytes): Query to write to serial adapter
+
+        Returns:
+            float: Value replied by the PSU
+
+        Raises:
+            TimeoutError: The reply was missing or incomplete
+        """
+        raw = self._txn(data, expected=5)
+        if len(raw) != 5:
+            raise TimeoutError("PSU did not reply to {!r}".format(data))
+        return float(raw)
+
+    def _settle(self, delay):
+        """Waits for the PSU to apply a command, deferred to the end of a batch
+
+        Args:
+            delay (float): Settling time [s]
+        """
+        if self._batch_buf is not None:
+            self._batch_delay = max(self._batch_delay, delay)
+        else:
+            time.sleep(delay)
+
+    @contextmanager
+    def batch(self):
+        """Collects set commands and sends them in a single write
+
+        The longest settling delay of the collected commands is waited once
+        at the end. Queries are not allowed inside the block. Nested blocks
+        join the outer one.
+
+        Example:
+            with psu.batch():
+                psu.setVolt(1, 5)
+                psu.setAmp(1, 0.5)
+                psu.setOut(True)
+        """
+        if self._batch_buf is not None:
+            yield
+            return
+        self._batch_buf = bytearray()
+        self._batch_delay = 0
+        try:
+            yield
+            data = bytes(self._batch_buf)
+            self._batch_buf = None
+            if data:
+                self._txn(data)
+                time.sleep(self._batch_delay)
+        except BaseException:
+            # The block or the flush failed, the remembered setpoints may not
+            # have reached the PSU
+            self._last_set.clear()
+            raise
+        finally:
+            self._batch_buf = None
     
     def getIdn(self):
         """Gets instrument identification
@@ -90,19 +538,50 @@ class ka3305pInstrument:
         Returns:
             Example output: "KORAD KD3005P V2.0 (Manufacturer, model name,)"
         """
-        return self.serWriteAndRecieve("*IDN?", 0.3)
+        # The reply has no terminator, wait for its first byte then for silence
+        raw = self._txn(_STATIC["*IDN?"], expected=1)
+        if not raw:
+            return None
+        return (raw + self._read_quiet()).decode("latin-1")
     
-    def setVolt(self, channel, voltage, delay=0.1):
+    def setVolt(self, channel, voltage, delay=0.1, wait_settled=False, tol=0.02, timeout=0.5):
         """Sets output voltage on channel
 
+        With wait_settled the output is measured until it is within tol of
+        the set voltage (or timeout expires) instead of waiting a fixed delay.
+        This only converges while the channel is in CV mode.
+
         Args:
             channel (int): Channel on which to set voltage (either 1 or 2)
             voltage (float): Voltage to be set [V]
             delay (float, optional): Delay allows PSU to set voltage. Defaults to 0.1.
+            wait_settled (bool, optional): Poll the output instead of waiting delay. Defaults to False.
+            tol (float, optional): Accepted deviation of the measured voltage [V]. Defaults to 0.02.
+            timeout (float, optional): Maximum time to wait for the output to settle [s]. Defaults to 0.5.
+
+        Returns:
+            bool: With wait_settled, True once the output settled, False if timeout expired
+
+        Raises:
+            RuntimeError: wait_settled was used inside batch(), it needs replies
         """
-        assert channel in self.channels, "Channel {} does not exist".format(channel)
-        self.serWriteAndRecieve("VSET{}:{:1.2f}".format(channel,voltage))
-        time.sleep(delay) 
+        if wait_settled and self._batch_buf is not None:
+            raise RuntimeError("wait_settled needs replies, it cannot be used in a batch")
+        pending = self._setpoint_cmd("V", channel, voltage)
+        if pending is not None:
+            cmd, key, wire = pending
+            self._txn(cmd)
+            self._last_set[key] = wire
+        if not wait_settled:
+            if pending is not None:
+                self._settle(delay)
+            return None
+        t0 = time.monotonic()
+        while time.monotonic() - t0 < timeout:
+            if abs(self.readVolt(channel) - voltage) < tol:
+                return True
+            time.sleep(_SETTLE_POLL)
+        return False
     
     def getVolt(self, channel):
         """Gets "set" voltage on channel
@@ -113,8 +592,7 @@ class ka3305pInstrument:
         Returns:
             float: Requested voltage on channel [V]
         """
-        assert channel in self.channels, "Channel {} does not exist".format(channel)
-        return self.serWriteAndRecieve("VSET{}?".format(channel))
+        return self._read_float(self._query_cmd(_VSETQ, channel))
     
     def readVolt(self, channel):
         """Requests voltage measurement on channel
@@ -125,8 +603,68 @@ class ka3305pInstrument:
         Returns:
             float: Measured voltage value on channel [V]
         """
-        assert channel in self.channels, "Channel {} does not exist".format(channel)
-        return self.serWriteAndRecieve("VOUT{}?".format(channel))
+        return self._read_float(self._query_cmd(_VOUTQ, channel))
+    
+    def read_all(self):
+        """Measures voltage and current on both channels in one transaction
+
+        The four queries are written at once and the PSU answers them in
+        order. If the combined reply is incomplete the channels are measured
+        one query at a time instead, for this and all later calls.
+
+        Returns:
+            tuple: Measured (V1 [V], V2 [V], I1 [A], I2 [A])
+        """
+        if self._pipeline_ok:
+            raw = self._read_full(_READ_ALL, 20)
+            if len(raw) == 20:
+                return self._decode_fields(raw)
+            log.warning("PSU did not answer pipelined queries, reading one at a time")
+            self._pipeline_ok = False
+        return (self.readVolt(1), self.readVolt(2), self.readAmp(1), self.readAmp(2))
+    
+    def log_channel(self, channel, n, dt):
+        """Measures voltage and current on channel n times
+
+        Each sample is one combined VOUT/IOUT query. The compiled
+        _ka3305p_fast extension is used when it is built and the port exposes
+        a file descriptor, otherwise the same loop runs in Python.
+
+        Args:
+            channel (int): Channel to measure
+            n (int): Number of samples
+            dt (float): Pause between samples [s]
+
+        Returns:
+            tuple: Measured voltages [V] and currents [A] as two array('d') of length n
+
+        Raises:
+            TimeoutError: The PSU did not answer a sample in time
+        """
+        if self._batch_buf is not None:
+            raise RuntimeError("Queries cannot be batched, they need a reply")
+        cmd = self._query_cmd(_VOUTQ, channel) + _IOUTQ[channel]
+        volts = array("d", bytes(8 * n))
+        amps = array("d", bytes(8 * n))
+        fd = None
+        if _ka3305p_fast is not None:
+            try:
+                fd = self.psu_com.fileno()
+            except (AttributeError, OSError):
+                pass
+        if fd is not None:
+            self.psu_com.reset_input_buffer()
+            _ka3305p_fast.poll_batch(fd, cmd, n, dt, volts, amps, self.psu_com.timeout)
+            return volts, amps
+        for i in range(n):
+            raw = self._read_full(cmd, 10)
+            if len(raw) < 10:
+                raise TimeoutError("PSU did not reply to sample {}".format(i))
+            volts[i] = float(raw[:5])
+            amps[i] = float(raw[5:])
+            if i + 1 < n:
+                time.sleep(dt)
+        return volts, amps
     
     def setAmp(self, channel, amp, delay=0.1):
         """Sets output current on channel
@@ -136,9 +674,13 @@ class ka3305pInstrument:
             amp (float): Current to be set [A]
             delay (float, optional): Delay allows PSU to set current. Defaults to 0.1.
         """
-        assert channel in self.channels, "Channel {} does not exist".format(channel)
-        self.serWriteAndRecieve("ISET{}:{:1.3f}".format(channel,amp))
-        time.sleep(delay) 
+        pending = self._setpoint_cmd("I", channel, amp)
+        if pending is None:
+            return
+        cmd, key, wire = pending
+        self._txn(cmd)
+        self._last_set[key] = wire
+        self._settle(delay)
     
     def getAmp(self, channel):
         """Gets "set" current on channel
@@ -149,8 +691,7 @@ class ka3305pInstrument:
         Returns:
             float: Requested current on channel [A]
         """
-        assert channel in self.channels, "Channel {} does not exist".format(channel)
-        return self.serWriteAndRecieve("ISET{}?".format(channel))
+        return self._read_float(self._query_cmd(_ISETQ, channel))
     
     def readAmp(self, channel):
         """Requests current measurement on channel
@@ -161,8 +702,7 @@ class ka3305pInstrument:
         Returns:
             float: Measured current value on channel [A]
         """
-        assert channel in self.channels, "Channel {} does not exist".format(channel)
-        return self.serWriteAndRecieve("IOUT{}?".format(channel))
+        return self._read_float(self._query_cmd(_IOUTQ, channel))
     
     def setOut(self, state):
         """Turns output ON or OFF
@@ -170,10 +710,9 @@ class ka3305pInstrument:
         Args:
             state (bool): True to turn on, False to turn off
         """
-        if(state == True):
-            self.serWriteAndRecieve("OUT1")
-        elif(state == False):
-            self.serWriteAndRecieve("OUT0")
+        cmd = self._toggle_cmd("OUT", state)
+        if cmd is not None:
+            self._txn(cmd)
     
     def toggleOcp(self, state):
         """Turns the Over Current Protection ON or OFF
@@ -181,11 +720,10 @@ class ka3305pInstrument:
         Args:
             state (bool): True to turn on, False to turn off
         """
-        if(state == True):
-            self.serWriteAndRecieve("OCP1")
-        elif(state == False):
-            self.serWriteAndRecieve("OCP0")
-
+        cmd = self._toggle_cmd("OCP", state)
+        if cmd is not None:
+            self._txn(cmd)
+    
     def setOcp(self, channel, amp, delay=0.1):
         """Sets Over Current Protection value on channel
 
@@ -194,9 +732,13 @@ class ka3305pInstrument:
             amp (float): OCP current [A]
             delay (float, optional): Delay allows PSU to set OCP value. Defaults to 0.1.
         """
-        assert channel in self.channels, "Channel {} does not exist".format(channel)
-        self.serWriteAndRecieve("OCPSTE{}:{:1.3f}".format(channel,amp))
-        time.sleep(delay)
+        pending = self._setpoint_cmd("OCP", channel, amp)
+        if pending is None:
+            return
+        cmd, key, wire = pending
+        self._txn(cmd)
+        self._last_set[key] = wire
+        self._settle(delay)
     
     def toggleOvp(self, state):
         """Turns the Over Voltage Protection ON or OFF
@@ -204,11 +746,10 @@ class ka3305pInstrument:
         Args:
             state (bool): True to turn on, False to turn off
         """
-        if(state == True):
-            self.serWriteAndRecieve("OVP1")
-        elif(state == False):
-            self.serWriteAndRecieve("OVP0")
-
+        cmd = self._toggle_cmd("OVP", state)
+        if cmd is not None:
+            self._txn(cmd)
+    
     def setOvp(self, channel, voltage, delay=0.1):
         """Sets Over Voltage Protection value on channel
 
@@ -217,26 +758,38 @@ class ka3305pInstrument:
             voltage (float): OCP voltage [V]
             delay (float, optional): Delay allows PSU to set OVP value. Defaults to 0.1.
         """
-        assert channel in self.channels, "Channel {} does not exist".format(channel)
-        self.serWriteAndRecieve("OVPSTE{}:{:1.3f}".format(channel,voltage))
-        time.sleep(delay)
+        pending = self._setpoint_cmd("OVP", channel, voltage)
+        if pending is None:
+            return
+        cmd, key, wire = pending
+        self._txn(cmd)
+        self._last_set[key] = wire
+        self._settle(delay)
     
-    def getStatus(self):
+    def getStatus(self, force=False):
         """Returns the PSU's status
 
+        The last reply is cached until a command that changes the status is
+        sent. The PSU can also change mode by itself (load change, protection
+        trip), use force to query it regardless.
+
+        Args:
+            force (bool, optional): Bypass the cached status. Defaults to False.
+
         Returns:
-            dict: Dictionary containing the current mode (CC - current, CV - voltage) and output status
+            mapping: Read-only mapping containing the current mode (CC - current, CV - voltage) and output status
+
+        Raises:
+            TimeoutError: The PSU did not reply
         """
-        stat = ord(self.serWriteAndRecieve("STATUS?")[0])
-        if (stat&(1 << 0))==0:
-            self.status["Mode"]="CC"
-        else:
-            self.status["Mode"]="CV"
-        if (stat&(1 << 6))==0:
-            self.status["Output"]="Off"
-        else:
-            self.status["Output"]="On"
-        return self.status
+        cached = self._cached_status(force)
+        if cached is not None:
+            return cached
+        gen = self._status_gen
+        raw = self._txn(_STATIC["STATUS?"], expected=1)
+        if not raw:
+            raise TimeoutError("PSU did not reply to STATUS?")
+        return self._decode_status(raw, gen)
 
     def recallPanel(self, panel):
         """Recalls panel setting to slot panel
@@ -244,8 +797,7 @@ class ka3305pInstrument:
         Args:
             panel (int): Panel setting to recall, an integer between 1 and 5
         """
-        assert panel in self.panels, "Panel {} does not exist".format(panel)
-        self.serWriteAndRecieve("RCL{}".format(panel))
+        self._txn(self._recall_cmd(panel))
 
     def savePanel(self, panel):
         """Saves panel setting to slot panel
@@ -253,8 +805,7 @@ class ka3305pInstrument:
         Args:
             panel (int): Panel setting to overwrite, an integer between 1 and 5
         """
-        assert panel in self.panels, "Panel {} does not exist".format(panel)
-        self.serWriteAndRecieve("SAV{}".format(panel))
+        self._txn(self._save_cmd(panel))
 
     def setMode(self,mode):
         """Sets the output of the power supply working on indepent or tracking mode
@@ -262,20 +813,178 @@ class ka3305pInstrument:
         Args:
             mode (int): Possibilities are 0=INDEP, 1=SER, 2=PARA
         """
-        assert mode in self.modes, "Mode {} does not exist".format(mode)
-        self.serWriteAndRecieve("TRACK{}".format(mode))
+        self._txn(self._mode_cmd(mode))
+
+
+class PSUBank:
+    """Drives several PSUs from a single thread
+
+    Commands are written to each port without waiting and pump() collects
+    the replies as they arrive, in the order they were submitted per PSU.
+    Needs ports with a selectable file descriptor (POSIX).
+
+    Example:
+        bank = PSUBank()
+        for psu in psus:
+            bank.add_psu(psu)
+            bank.submit(psu, b"VOUT1?", 5, print)
+        while bank.busy():
+            bank.pump(0.5)
+    """
+    __slots__ = ("sel", "pending", "_partial")
+
+    def __init__(self):
+        """Constructor
+        """
+        self.sel = selectors.DefaultSelector()
+        # fd -> deque of (expected reply length, callback)
+        self.pending = {}
+        # fd -> bytes received so far of the oldest pending reply
+        self._partial = {}
+
+    def add_psu(self, psu):
+        """Registers a PSU with the bank
+
+        Args:
+            psu (ka3305pInstrument): Connected PSU
+        """
+        fd = psu.fileno()
+        self.sel.register(fd, selectors.EVENT_READ, psu)
+        self.pending[fd] = deque()
+        self._partial[fd] = bytearray()
+
+    def remove_psu(self, psu):
+        """Unregisters a PSU, dropping replies still pending for it
+
+        Does nothing if the PSU is not in the bank, e.g. because pump()
+        already dropped its closed port.
+
+        Args:
+            psu (ka3305pInstrument): PSU previously added to the bank
+        """
+        fd = psu.fileno()
+        if fd in self.pending:
+            self._drop(fd)
+
+    def _drop(self, fd):
+        """Forgets a port and the replies still pending on it
+
+        Args:
+            fd (int): File descriptor of the port
+        """
+        self.sel.unregister(fd)
+        del self.pending[fd]
+        del self._partial[fd]
+
+    def submit(self, psu, cmd, expected, callback=None):
+        """Writes a command to a PSU without waiting for the reply
+
+        Set commands (expected 0) make the driver forget its cached status
+        and setpoints, as it cannot tell what they changed.
+
+        Args:
+            psu (ka3305pInstrument): PSU previously added to the bank
+            cmd (bytes): Command to write
+            expected (int): Number of bytes in the reply, 0 for set commands
+            callback (callable, optional): Called by pump() with the reply bytes. Defaults to None.
+
+        Raises:
+            PSUConnectionError: The PSU is not in the bank, or its port was closed
+            TimeoutError: The port did not accept the command within its write timeout
+        """
+        fd = psu.fileno()
+        queue = self.pending.get(fd)
+        if queue is None:
+            raise PSUConnectionError("PSU on fd {} is not in the bank".format(fd))
+        if not queue:
+            # Nothing is expected from this PSU, anything buffered is stale
+            psu.psu_com.reset_input_buffer()
+        view = memoryview(cmd)
+        while view:
+            try:
+                view = view[os.write(fd, view):]
+            except BlockingIOError:
+                # The port is opened non-blocking, wait until it drains
+                if not select.select([], [fd], [], psu.psu_com.write_timeout)[1]:
+                    raise TimeoutError("Write to PSU timed out")
+        if expected:
+            queue.append((expected, callback))
+            return
+        # A set command bypasses the driver, its cached status and setpoints
+        # no longer describe the PSU
+        psu._invalidate()
+        if callback is not None:
+            callback(b"")
+
+    def busy(self):
+        """Tells whether replies are still pending
+
+        Returns:
+            bool: True if any PSU still owes a reply
+        """
+        return any(self.pending.values())
+
+    def pump(self, timeout=None):
+        """Reads the replies that have arrived and runs their callbacks
+
+        Args:
+            timeout (float, optional): Maximum wait for a port to become readable [s],
+                None to wait indefinitely. Defaults to None.
+
+        Returns:
+            int: Number of replies completed
+        """
+        done = 0
+        for key, _ in self.sel.select(timeout):
+            fd = key.fd
+            queue = self.pending[fd]
+            partial = self._partial[fd]
+            while True:
+                # Unsolicited bytes are read and dropped, nobody waits for them
+                expected, callback = queue[0] if queue else (64, None)
+                try:
+                    chunk = os.read(fd, expected - len(partial))
+                except BlockingIOError:
+                    break
+                if not chunk:
+                    # End of file: the port stays readable forever, stop
+                    # watching it instead of spinning on it
+                    log.warning("Port %d closed, dropping %d pending replies", fd, len(queue))
+                    self._drop(fd)
+                    break
+                if not queue:
+                    continue
+                partial += chunk
+                if len(partial) < expected:
+                    break
+                queue.popleft()
+                reply = bytes(partial)
+                partial.clear()
+                done += 1
+                if callback is not None:
+                    callback(reply)
+        return done
+
+
+def __getattr__(name):
+    # The asyncio class lives in its own module so that importing this one
+    # does not pay for importing asyncio
+    if name == "ka3305pAsyncInstrument":
+        from ka3305_async import ka3305pAsyncInstrument
+        return ka3305pAsyncInstrument
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
 
 if __name__ == "__main__":
     # This example is for Ubuntu, in Windows the port will most likely be COM*
+    # Connect to PSU, raises PSUConnectionError if the port cannot be opened
     psu = ka3305pInstrument('/dev/ttyUSB0')
-    # Connect to PSU
-    if psu.isConnected == True:
-        # Get ID
-        print(psu.getIdn())
-        # Request voltage on channel 1
-        psu.setVolt(1,13.37)
-        # Request voltage measurement on channel 1
-        print(psu.readVolt(1))
-        # Get PSU status
-        print(psu.status)
+    # Get ID
+    print(psu.getIdn())
+    # Request voltage on channel 1
+    psu.setVolt(1,13.37)
+    # Request voltage measurement on channel 1
+    print(psu.readVolt(1))
+    # Get PSU status
+    print(psu.getStatus())
     psu.close()
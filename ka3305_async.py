@@ -0,0 +1,388 @@
+# -*- coding: utf-8 -*-
+#
+#  Copyright 2020 pietroro
+#  ------------
+#  Based on the 2017 original work by uberdaff
+#  
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#  
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#  
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+
+"""asyncio interface to the KA3305P, see ka3305pAsyncInstrument"""
+
+import asyncio
+import logging
+import time
+
+from ka3305 import (PSUConnectionError, _IOUTQ, _ISETQ, _QUIET_GAP, _READ_ALL,
+                    _SETTLE_POLL, _STATIC, _VOUTQ, _VSETQ, _ka3305pBase)
+
+log = logging.getLogger(__name__)
+
+
+class ka3305pAsyncInstrument(_ka3305pBase):
+    """asyncio counterpart of ka3305pInstrument
+
+    Every method is a coroutine, so the event loop keeps running while a
+    transaction with the PSU is in flight. Requires pyserial-asyncio.
+    """
+    __slots__ = ("_reader", "_writer", "timeout", "_lock", "_stale")
+
+    def __init__(self, reader, writer, timeout=0.3):
+        """Constructor, use connect() to open a PSU
+
+        Args:
+            reader (asyncio.StreamReader): Stream reading from the serial adapter
+            writer (asyncio.StreamWriter): Stream writing to the serial adapter
+            timeout (float, optional): Maximum wait for a reply [s]. Defaults to 0.3.
+        """
+        self._reader = reader
+        self._writer = writer
+        self.timeout = timeout
+        self._init_state()
+        # The PSU does not tag replies, only one transaction may be on the wire
+        self._lock = asyncio.Lock()
+        # Set when a reply was not fully read, its tail may still arrive
+        self._stale = False
+
+    @classmethod
+    async def connect(cls, port):
+        """Opens a connection to the PSU
+
+        Args:
+            port (string): COM port on which serial is connected
+
+        Returns:
+            ka3305pAsyncInstrument: Connected instrument
+
+        Raises:
+            PSUConnectionError: The COM port could not be opened
+        """
+        import serial
+        import serial_asyncio
+
+        try:
+            reader, writer = await serial_asyncio.open_serial_connection(
+                url=port,
+                baudrate=9600,
+                parity=serial.PARITY_NONE,
+                stopbits=serial.STOPBITS_ONE,
+                bytesize=serial.EIGHTBITS,
+                dsrdtr=False,
+                rtscts=False,
+                xonxoff=False
+            )
+        except (serial.SerialException, OSError) as exc:
+            log.exception("COM port failure on %s", port)
+            raise PSUConnectionError(str(exc)) from exc
+        return cls(reader, writer)
+
+    async def close(self):
+        """Closes connection to the PSU
+        """
+        self._writer.close()
+        await self._writer.wait_closed()
+
+    async def _txn(self, data, expected=0, delay=0):
+        """Writes a command and awaits the reply
+
+        Transactions are serialized so concurrent callers cannot interleave
+        on the wire. The settling delay is spent holding the lock, so the
+        next command only starts once the PSU has applied this one.
+
+        Args:
+            data (bytes): Command to write to serial adapter
+            expected (int, optional): Number of bytes in the reply, None to read
+                until the PSU has been silent for _QUIET_GAP. Defaults to 0.
+            delay (float, optional): Settling time after the command. Defaults to 0.
+
+        Returns:
+            bytes: Reply from PSU, None if no reply was requested
+        """
+        async with self._lock:
+            if self._stale:
+                await self._discard_input()
+            self._writer.write(data)
+            await self._writer.drain()
+            if expected is None:
+                # Wait up to the timeout for the reply to start, then for silence
+                raw = bytearray()
+                wait = self.timeout
+                try:
+                    while True:
+                        chunk = await asyncio.wait_for(self._reader.read(64), wait)
+                        if not chunk:
+                            break
+                        raw += chunk
+                        wait = _QUIET_GAP
+                except asyncio.TimeoutError:
+                    pass
+            elif expected:
+                try:
+                    raw = await asyncio.wait_for(self._reader.readexactly(expected), self.timeout)
+                except BaseException:
+                    self._stale = True
+                    raise
+            else:
+                raw = None
+            if delay:
+                await asyncio.sleep(delay)
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("TX %r -> RX %r", data, raw)
+        return raw
+
+    async def _discard_input(self):
+        """Reads and drops whatever the PSU still sends from an earlier reply
+        """
+        try:
+            while await asyncio.wait_for(self._reader.read(64), 0.02):
+                pass
+        except asyncio.TimeoutError:
+            pass
+        self._stale = False
+
+    async def _read_float(self, data):
+        """Sends a query with a fixed width numeric reply
+
+        Args:
+            data (bytes): Query to write to serial adapter
+
+        Returns:
+            float: Value replied by the PSU
+        """
+        return float(await self._txn(data, expected=5))
+
+    async def getIdn(self):
+        """Gets instrument identification
+
+        Returns:
+            Example output: "KORAD KD3005P V2.0 (Manufacturer, model name,)"
+        """
+        raw = await self._txn(_STATIC["*IDN?"], expected=None)
+        if raw:
+            return raw.decode("latin-1")
+        return None
+
+    async def setVolt(self, channel, voltage, delay=0.1, wait_settled=False, tol=0.02, timeout=0.5):
+        """Sets output voltage on channel
+
+        With wait_settled the output is measured until it is within tol of
+        the set voltage (or timeout expires) instead of waiting a fixed delay.
+        This only converges while the channel is in CV mode.
+
+        Args:
+            channel (int): Channel on which to set voltage (either 1 or 2)
+            voltage (float): Voltage to be set [V]
+            delay (float, optional): Delay allows PSU to set voltage. Defaults to 0.1.
+            wait_settled (bool, optional): Poll the output instead of waiting delay. Defaults to False.
+            tol (float, optional): Accepted deviation of the measured voltage [V]. Defaults to 0.02.
+            timeout (float, optional): Maximum time to wait for the output to settle [s]. Defaults to 0.5.
+
+        Returns:
+            bool: With wait_settled, True once the output settled, False if timeout expired
+        """
+        pending = self._setpoint_cmd("V", channel, voltage)
+        if pending is not None:
+            cmd, key, wire = pending
+            await self._txn(cmd, delay=0 if wait_settled else delay)
+            self._last_set[key] = wire
+        if not wait_settled:
+            return None
+        t0 = time.monotonic()
+        while time.monotonic() - t0 < timeout:
+            if abs(await self.readVolt(channel) - voltage) < tol:
+                return True
+            await asyncio.sleep(_SETTLE_POLL)
+        return False
+
+    async def getVolt(self, channel):
+        """Gets "set" voltage on channel
+
+        Args:
+            channel (int): Channel from which to read voltage
+
+        Returns:
+            float: Requested voltage on channel [V]
+        """
+        return await self._read_float(self._query_cmd(_VSETQ, channel))
+
+    async def readVolt(self, channel):
+        """Requests voltage measurement on channel
+
+        Args:
+            channel (int): Channel from which to measure voltage
+
+        Returns:
+            float: Measured voltage value on channel [V]
+        """
+        return await self._read_float(self._query_cmd(_VOUTQ, channel))
+
+    async def read_all(self):
+        """Measures voltage and current on both channels in one transaction
+
+        The four queries are written at once and the PSU answers them in
+        order. If the combined reply times out the channels are measured
+        one query at a time instead, for this and all later calls.
+
+        Returns:
+            tuple: Measured (V1 [V], V2 [V], I1 [A], I2 [A])
+        """
+        if self._pipeline_ok:
+            try:
+                return self._decode_fields(await self._txn(_READ_ALL, expected=20))
+            except (asyncio.TimeoutError, asyncio.IncompleteReadError):
+                log.warning("PSU did not answer pipelined queries, reading one at a time")
+                self._pipeline_ok = False
+        return (await self.readVolt(1), await self.readVolt(2),
+                await self.readAmp(1), await self.readAmp(2))
+
+    async def setAmp(self, channel, amp, delay=0.1):
+        """Sets output current on channel
+
+        Args:
+            channel (int): Channel on which to set current (either 1 or 2)
+            amp (float): Current to be set [A]
+            delay (float, optional): Delay allows PSU to set current. Defaults to 0.1.
+        """
+        pending = self._setpoint_cmd("I", channel, amp)
+        if pending is None:
+            return
+        cmd, key, wire = pending
+        await self._txn(cmd, delay=delay)
+        self._last_set[key] = wire
+
+    async def getAmp(self, channel):
+        """Gets "set" current on channel
+
+        Args:
+            channel (int): Channel from which to read current
+
+        Returns:
+            float: Requested current on channel [A]
+        """
+        return await self._read_float(self._query_cmd(_ISETQ, channel))
+
+    async def readAmp(self, channel):
+        """Requests current measurement on channel
+
+        Args:
+            channel (int): Channel from which to measure current
+
+        Returns:
+            float: Measured current value on channel [A]
+        """
+        return await self._read_float(self._query_cmd(_IOUTQ, channel))
+
+    async def setOut(self, state):
+        """Turns output ON or OFF
+
+        Args:
+            state (bool): True to turn on, False to turn off
+        """
+        cmd = self._toggle_cmd("OUT", state)
+        if cmd is not None:
+            await self._txn(cmd)
+
+    async def toggleOcp(self, state):
+        """Turns the Over Current Protection ON or OFF
+
+        Args:
+            state (bool): True to turn on, False to turn off
+        """
+        cmd = self._toggle_cmd("OCP", state)
+        if cmd is not None:
+            await self._txn(cmd)
+
+    async def setOcp(self, channel, amp, delay=0.1):
+        """Sets Over Current Protection value on channel
+
+        Args:
+            channel (int): Channel on which to set OCP value (either 1 or 2)
+            amp (float): OCP current [A]
+            delay (float, optional): Delay allows PSU to set OCP value. Defaults to 0.1.
+        """
+        pending = self._setpoint_cmd("OCP", channel, amp)
+        if pending is None:
+            return
+        cmd, key, wire = pending
+        await self._txn(cmd, delay=delay)
+        self._last_set[key] = wire
+
+    async def toggleOvp(self, state):
+        """Turns the Over Voltage Protection ON or OFF
+
+        Args:
+            state (bool): True to turn on, False to turn off
+        """
+        cmd = self._toggle_cmd("OVP", state)
+        if cmd is not None:
+            await self._txn(cmd)
+
+    async def setOvp(self, channel, voltage, delay=0.1):
+        """Sets Over Voltage Protection value on channel
+
+        Args:
+            channel (int): Channel on which to set OVP value (either 1 or 2)
+            voltage (float): OCP voltage [V]
+            delay (float, optional): Delay allows PSU to set OVP value. Defaults to 0.1.
+        """
+        pending = self._setpoint_cmd("OVP", channel, voltage)
+        if pending is None:
+            return
+        cmd, key, wire = pending
+        await self._txn(cmd, delay=delay)
+        self._last_set[key] = wire
+
+    async def getStatus(self, force=False):
+        """Returns the PSU's status
+
+        The last reply is cached until a command that changes the status is
+        sent. The PSU can also change mode by itself (load change, protection
+        trip), use force to query it regardless.
+
+        Args:
+            force (bool, optional): Bypass the cached status. Defaults to False.
+
+        Returns:
+            mapping: Read-only mapping containing the current mode (CC - current, CV - voltage) and output status
+        """
+        cached = self._cached_status(force)
+        if cached is not None:
+            return cached
+        gen = self._status_gen
+        return self._decode_status(await self._txn(_STATIC["STATUS?"], expected=1), gen)
+
+    async def recallPanel(self, panel):
+        """Recalls panel setting to slot panel
+
+        Args:
+            panel (int): Panel setting to recall, an integer between 1 and 5
+        """
+        await self._txn(self._recall_cmd(panel))
+
+    async def savePanel(self, panel):
+        """Saves panel setting to slot panel
+
+        Args:
+            panel (int): Panel setting to overwrite, an integer between 1 and 5
+        """
+        await self._txn(self._save_cmd(panel))
+
+    async def setMode(self,mode):
+        """Sets the output of the power supply working on indepent or tracking mode
+
+        Args:
+            mode (int): Possibilities are 0=INDEP, 1=SER, 2=PARA
+        """
+        await self._txn(self._mode_cmd(mode))